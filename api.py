@@ -0,0 +1,181 @@
+import asyncio
+import fcntl
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, File, Header, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+from pydantic import BaseModel, Field
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+
+import rag_utils
+from llm_chat import generate_response, generate_response_stream
+from tenants import DEFAULT_TENANT, uploads_dir, validate_tenant
+import google_calendar
+import google_drive
+
+# Run with: uvicorn api:app --workers 4
+# Each tenant (X-Tenant header) has its own index shard under RAG_INDEX_DIR and its own
+# uploads folder, and can only search and chat about its own documents. Every worker
+# memory-maps the shards it searches; ingests into a shard are serialized with a file lock
+# and the other workers pick up the new shard on their next search.
+MAX_CONCURRENCY = int(os.environ.get("RAG_API_MAX_CONCURRENCY", "8"))  # per worker
+QUEUE_TIMEOUT = float(os.environ.get("RAG_API_QUEUE_TIMEOUT", "10"))  # seconds
+MAX_TOP_K = 50
+
+services = {"drive": None, "calendar": None}
+request_slots = asyncio.Semaphore(MAX_CONCURRENCY)
+
+
+class ChatRequest(BaseModel):
+    message: str
+    stream: bool = False
+
+
+class SearchRequest(BaseModel):
+    query: str
+    top_k: int = Field(3, ge=1, le=MAX_TOP_K)
+    rerank: bool = False
+    min_score: float | None = None
+
+
+# Build a Google service from a saved token, refreshing it if needed. Never starts the
+# interactive OAuth flow (it can't run headless); returns None so the feature is skipped.
+def load_authorized_service(token_file, scopes, api_name, api_version):
+    if not os.path.exists(token_file):
+        return None
+    try:
+        creds = Credentials.from_authorized_user_file(token_file, scopes)
+        if not creds.valid and creds.expired and creds.refresh_token:
+            creds.refresh(Request())
+    except Exception as e:
+        print(f"Skipping {api_name}: {e}")
+        return None
+    if not creds.valid:
+        print(f"Skipping {api_name}: token in {token_file} is not valid")
+        return None
+    return build(api_name, api_version, credentials=creds)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    services["drive"] = load_authorized_service("token_drive.json", google_drive.SCOPES, "drive", "v3")
+    services["calendar"] = load_authorized_service("token_calendar.json", google_calendar.SCOPES, "calendar", "v3")
+    yield
+
+
+app = FastAPI(title="RAG-GPT-Assistant", lifespan=lifespan)
+
+
+# ---------------- Concurrency Limit ----------------
+async def acquire_slot():
+    try:
+        await asyncio.wait_for(request_slots.acquire(), QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Server busy, please retry shortly.")
+
+
+# ---------------- Tenant Shards ----------------
+def check_tenant(tenant):
+    try:
+        validate_tenant(tenant)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return tenant
+
+
+# Save and index an upload under the tenant's file lock (one open() per call, so it also
+# serializes threads), so concurrent uploads of the same name can't swap contents.
+# The upload only replaces uploads/<tenant>/<file_name> once it has been indexed;
+# raises ValueError (and keeps nothing) if no text can be extracted.
+def ingest_file(file_name, content, tenant):
+    directory = rag_utils.shard_dir(tenant)
+    tenant_uploads = uploads_dir(tenant)
+    os.makedirs(directory, exist_ok=True)
+    os.makedirs(tenant_uploads, exist_ok=True)
+    with open(os.path.join(directory, ".write.lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            pending_path = os.path.join(tenant_uploads, f".upload-{file_name}")
+            with open(pending_path, "wb") as f:
+                f.write(content)
+            try:
+                rag_utils.refresh_shard(tenant)  # Pick up adds from other workers
+                status = rag_utils.index_document(pending_path, tenant=tenant, source=file_name)
+            except Exception:
+                os.remove(pending_path)
+                raise
+            os.replace(pending_path, os.path.join(tenant_uploads, file_name))
+            return status
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def search_index(query, top_k, rerank, min_score, tenants):
+    for tenant in tenants:
+        rag_utils.refresh_shard(tenant, mmap=True)
+    return rag_utils.search_documents(query, top_k=top_k, rerank=rerank, min_score=min_score, tenants=tenants)
+
+
+# ---------------- Endpoints ----------------
+@app.get("/health")
+async def health():
+    return {"status": "ok", "loaded_shards": len(rag_utils.loaded_tenants())}
+
+
+@app.post("/chat")
+async def chat(request: ChatRequest, x_tenant: str = Header(DEFAULT_TENANT)):
+    tenant = check_tenant(x_tenant)
+    await acquire_slot()
+    if not request.stream:
+        try:
+            # The semaphore bounds in-flight requests, so skip the per-process chat throttle
+            response = await run_in_threadpool(generate_response, request.message,
+                                               services["drive"], services["calendar"], throttle=False, tenant=tenant)
+        finally:
+            request_slots.release()
+        return {"response": response}
+
+    async def stream():
+        try:
+            chunks = generate_response_stream(request.message, services["drive"], services["calendar"],
+                                              throttle=False, tenant=tenant)
+            async for chunk in iterate_in_threadpool(chunks):
+                yield chunk
+        finally:
+            request_slots.release()
+
+    return StreamingResponse(stream(), media_type="text/plain; charset=utf-8")
+
+
+@app.post("/ingest")
+async def ingest(file: UploadFile = File(...), x_tenant: str = Header(DEFAULT_TENANT)):
+    tenant = check_tenant(x_tenant)
+    file_name = os.path.basename(file.filename or "")
+    if not file_name.lower().endswith(rag_utils.SUPPORTED_TYPES):
+        raise HTTPException(status_code=400, detail="Only PDF, TXT and DOCX files are supported.")
+
+    await acquire_slot()
+    try:
+        content = await file.read()
+        status = await run_in_threadpool(ingest_file, file_name, content, tenant)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    finally:
+        request_slots.release()
+    return {"tenant": tenant, "file": file_name, "status": status, "result": f"✅ File '{file_name}' {status}."}
+
+
+@app.post("/search")
+async def search(request: SearchRequest, x_tenant: str = Header(DEFAULT_TENANT)):
+    tenants = [check_tenant(x_tenant)]
+    await acquire_slot()
+    try:
+        results = await run_in_threadpool(search_index, request.query, request.top_k,
+                                          request.rerank, request.min_score, tenants)
+    finally:
+        request_slots.release()
+    return {"query": request.query, "results": results}
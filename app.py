@@ -3,9 +3,11 @@ import pandas as pd
 from google_calendar import list_events, create_task, schedule_event, list_tasks, get_calendar_service, update_event, delete_event, TASK_IDENTIFIER
 from google_drive import get_drive_service, upload_file, list_files, download_file
 from llm_chat import generate_response, format_datetime
-from rag_utils import add_document, search_documents  # ✅ Import RAG functions
+from tenants import uploads_dir, validate_tenant
 from datetime import datetime, timedelta
 import os
+import uuid
+import requests
 
 # ✅ Set Page Configuration
 st.set_page_config(page_title="Personal Chatbot", layout="wide", initial_sidebar_state="expanded")
@@ -14,6 +16,30 @@ st.set_page_config(page_title="Personal Chatbot", layout="wide", initial_sidebar
 UPLOADS_DIR = "uploads"
 os.makedirs(UPLOADS_DIR, exist_ok=True)
 
+# ✅ Optional headless backend (api.py); when set, chat and ingest go over HTTP
+RAG_API_URL = os.environ.get("RAG_API_URL", "").rstrip("/")
+
+# Index a saved upload under its original name; returns (ok, message)
+def ingest_document(file_path, file_name, tenant):
+    if RAG_API_URL:
+        try:
+            with open(file_path, "rb") as f:
+                reply = requests.post(f"{RAG_API_URL}/ingest", files={"file": (file_name, f)},
+                                      headers={"X-Tenant": tenant}, timeout=300)
+        except requests.RequestException as e:
+            return False, f"Ingest failed: could not reach the API ({e})"
+        if not reply.ok:
+            return False, f"Ingest failed: {reply.text}"
+        return True, reply.json().get("result", reply.text)
+
+    from rag_utils import index_document  # ✅ Only the local backend loads the embedding model
+    try:
+        status = index_document(file_path, tenant=tenant, source=file_name)
+    except ValueError as e:
+        return False, str(e)
+    return True, f"File '{file_name}' {status} in the knowledge base."
+
+
 # ✅ Initialize Session State
 if "page" not in st.session_state:
     st.session_state.page = "Chat"  # Default to Chat
@@ -21,6 +47,19 @@ if "page" not in st.session_state:
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
+# ✅ Uploads already indexed this session, so page reruns don't ingest them again
+if "ingested" not in st.session_state:
+    st.session_state.ingested = set()
+
+# ✅ Each browser gets its own workspace (index shard + uploads); it's kept in the URL so a refresh keeps it
+if "tenant" not in st.session_state:
+    workspace = st.query_params.get("workspace", "")
+    try:
+        st.session_state.tenant = validate_tenant(workspace)
+    except ValueError:
+        st.session_state.tenant = uuid.uuid4().hex[:16]
+st.query_params["workspace"] = st.session_state.tenant
+
 # ✅ Sidebar Navigation
 with st.sidebar:
     st.markdown("""
@@ -64,6 +103,15 @@ with st.sidebar:
         st.success("Chat history cleared!")
         st.rerun()
 
+    workspace = st.text_input("Workspace ID", value=st.session_state.tenant,
+                              help="Letters, digits, '-' and '_'. Uploads are only searchable within this workspace.")
+    if workspace != st.session_state.tenant:
+        try:
+            st.session_state.tenant = validate_tenant(workspace)
+            st.query_params["workspace"] = workspace
+        except ValueError:
+            st.error("Workspace ID may only contain letters, digits, '-' and '_' (max 64).")
+
 # ✅ Load Google Services
 drive_service = get_drive_service()
 calendar_service = get_calendar_service()
@@ -93,8 +141,21 @@ if st.session_state.page == "Chat":
         st.session_state.messages.append({"role": "user", "content": prompt})
 
         with st.chat_message("assistant"):
-            response = generate_response(prompt, drive_service, calendar_service)
-            st.markdown(response)
+            if RAG_API_URL:
+                try:
+                    reply = requests.post(f"{RAG_API_URL}/chat", json={"message": prompt, "stream": True},
+                                          headers={"X-Tenant": st.session_state.tenant}, stream=True, timeout=120)
+                    if reply.ok:
+                        response = st.write_stream(reply.iter_content(chunk_size=None, decode_unicode=True))
+                    else:
+                        response = f"❌ Chat failed: {reply.text}"
+                        st.error(response)
+                except requests.RequestException as e:
+                    response = f"❌ Chat failed: could not reach the API ({e})"
+                    st.error(response)
+            else:
+                response = generate_response(prompt, drive_service, calendar_service, tenant=st.session_state.tenant)
+                st.markdown(response)
         st.session_state.messages.append({"role": "assistant", "content": response})
 
 # ✅ Dashboard Page
@@ -187,42 +248,38 @@ elif st.session_state.page == "Dashboard":
             st.rerun()
 
     # ✅ FILE UPLOAD & RAG SEARCH
-    UPLOADS_DIR = "uploads"
-if not os.path.exists(UPLOADS_DIR):
-    os.makedirs(UPLOADS_DIR)
+tenant_uploads = uploads_dir(st.session_state.tenant)
+os.makedirs(tenant_uploads, exist_ok=True)
 
 st.subheader("📂 Upload File for RAG-based Search")
 
 uploaded_file = st.file_uploader("Upload a document for search", type=["pdf", "txt", "docx"])
 
 if uploaded_file is not None:
-    file_path = os.path.join(UPLOADS_DIR, uploaded_file.name)
-
-    try:
-        # ✅ Save the file properly
-        with open(file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-
-        # ✅ Confirm the file exists before processing
-        if os.path.exists(file_path):
-            st.success(f"File '{uploaded_file.name}' uploaded successfully!")
-
-            # ✅ Debugging: Check stored path
-            st.write("Debug: File path stored →", file_path)
-
-            # ✅ Try adding document to RAG
-            result = add_document(file_path)
-            st.success(result)
-
-        else:
-            st.error("File saving failed. Please try again.")
-
-    except Exception as e:
-        st.error(f"Error saving file: {e}")
+    upload_key = (st.session_state.tenant, uploaded_file.name, uploaded_file.size)
+    file_path = os.path.join(tenant_uploads, uploaded_file.name)
+
+    if upload_key in st.session_state.ingested:
+        st.info(f"File '{uploaded_file.name}' is already in the knowledge base.")
+    else:
+        # ✅ Save to a pending file; it only replaces the upload once it has been indexed
+        pending_path = os.path.join(tenant_uploads, f".upload-{uploaded_file.name}")
+        try:
+            with open(pending_path, "wb") as f:
+                f.write(uploaded_file.getbuffer())
+
+            ok, message = ingest_document(pending_path, uploaded_file.name, st.session_state.tenant)
+            if ok:
+                os.replace(pending_path, file_path)
+                st.session_state.ingested.add(upload_key)
+                st.success(message)
+            else:
+                os.remove(pending_path)
+                st.error(message)
 
-    st.write("Uploaded files in 'uploads' folder:", os.listdir("uploads"))
+        except Exception as e:
+            if os.path.exists(pending_path):
+                os.remove(pending_path)
+            st.error(f"Error saving file: {e}")
 
-    st.write("Debug: File path stored →", file_path)
-    st.write("Trying to add document to RAG...")
-    result = add_document(file_path)
-    st.write("RAG Response:", result)
\ No newline at end of file
+    st.write("Uploaded files in your workspace:", [f for f in os.listdir(tenant_uploads) if not f.startswith(".")])
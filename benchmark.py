@@ -0,0 +1,401 @@
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Usage:
+#   python benchmark.py --docs 200 --output bench_main.json
+#   python benchmark.py --docs 200 --output bench_branch.json --compare bench_main.json
+#
+# Gemini and Google services are always stubbed so runs are offline and repeatable.
+# Pass --stub-embeddings to also replace the sentence-transformers models (embedder and
+# --rerank cross-encoder) with deterministic stand-ins (no model download, but not
+# representative of real model throughput).
+
+WORDS = (
+    "account budget calendar client contract delivery design draft estimate "
+    "feedback forecast invoice launch meeting milestone notes onboarding plan "
+    "policy proposal quarter release report review risk roadmap schedule "
+    "security sprint summary support team timeline training update vendor"
+).split()
+
+CODENAMES = (
+    "amber basalt cobalt delta ember falcon garnet harbor indigo juniper kestrel "
+    "lagoon marble nebula onyx pepper quartz raven saffron tundra umber velvet "
+    "willow xenon yarrow zephyr"
+).split()
+
+FILE_TYPES = ("txt", "docx", "pdf")
+
+
+# ---------------- Offline Stubs ----------------
+class _StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubGeminiModel:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+
+    def generate_content(self, prompt):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return _StubResponse(f"stub reply ({len(prompt)} prompt chars)")
+
+
+class _StubRequest:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        return self.result
+
+
+class _StubResource:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def list(self, **kwargs):
+        return _StubRequest(self.payload)
+
+    def insert(self, **kwargs):
+        return _StubRequest({"id": "stub-event", **kwargs.get("body", {})})
+
+
+class StubDriveService:
+    def __init__(self, file_count=50):
+        self._files = {"files": [{"id": f"file-{i}", "name": f"doc_{i}.pdf", "mimeType": "application/pdf"}
+                                 for i in range(file_count)]}
+
+    def files(self):
+        return _StubResource(self._files)
+
+
+class StubCalendarService:
+    def __init__(self, event_count=20):
+        start = datetime.now(timezone.utc)
+        self._events = {"items": [{"id": f"event-{i}", "summary": f"Event {i}",
+                                   "start": {"dateTime": start.isoformat()}}
+                                  for i in range(event_count)]}
+
+    def events(self):
+        return _StubResource(self._events)
+
+
+class HashingEmbedder:
+    # Bag-of-words hashed into a fixed-size unit vector
+    def __init__(self, dimension=384):
+        self.dimension = dimension
+
+    def encode(self, texts):
+        vectors = np.zeros((len(texts), self.dimension), dtype="float32")
+        for row, text in enumerate(texts):
+            for token in text.lower().split():
+                bucket = int(hashlib.md5(token.encode("utf-8")).hexdigest()[:8], 16) % self.dimension
+                vectors[row, bucket] += 1.0
+            norm = np.linalg.norm(vectors[row])
+            if norm:
+                vectors[row] /= norm
+        return vectors
+
+
+class StubCrossEncoder:
+    # Scores a (query, passage) pair by how many query tokens the passage contains
+    def predict(self, pairs, batch_size=32):
+        return np.array([float(sum(token in passage.lower() for token in query.lower().split()))
+                         for query, passage in pairs], dtype="float32")
+
+
+# ---------------- Synthetic Corpus ----------------
+def make_text(rng, codename, doc_no, words_per_doc):
+    # Topic sentence first: the embedding model truncates long inputs
+    header = f"Project {codename} {doc_no} status report for the {codename} {doc_no} workstream."
+    body = " ".join(rng.choice(WORDS) for _ in range(words_per_doc))
+    return f"{header}\n{body}"
+
+
+def write_txt(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def write_docx(path, text):
+    import docx
+    document = docx.Document()
+    for line in text.split("\n"):
+        document.add_paragraph(line)
+    document.save(path)
+
+
+def write_pdf(path, text, chars_per_line=90, lines_per_page=50):
+    # Minimal single-font PDF writer, enough for pdfplumber to extract text
+    lines = []
+    for paragraph in text.split("\n"):
+        while len(paragraph) > chars_per_line:
+            cut = paragraph.rfind(" ", 0, chars_per_line)
+            cut = cut if cut > 0 else chars_per_line
+            lines.append(paragraph[:cut])
+            paragraph = paragraph[cut:].lstrip()
+        lines.append(paragraph)
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[""]]
+
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_refs = []
+    for page_lines in pages:
+        escaped = [l.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for l in page_lines]
+        stream = "BT /F1 10 Tf 14 TL 40 800 Td " + " ".join(f"({l}) '" for l in escaped) + " ET"
+        objects.append(f"<< /Length {len(stream.encode('latin-1'))} >>\nstream\n{stream}\nendstream")
+        content_ref = len(objects)
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_ref} 0 R >>")
+        page_refs.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(page_refs)}] /Count {len(page_refs)} >>"
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+WRITERS = {"txt": write_txt, "docx": write_docx, "pdf": write_pdf}
+
+
+def build_corpus(corpus_dir, doc_count, words_per_doc, file_types, seed, tenant_count=1):
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(doc_count):
+        file_type = file_types[i % len(file_types)]
+        codename = CODENAMES[i % len(CODENAMES)]
+        text = make_text(rng, codename, i, words_per_doc)
+        path = os.path.join(corpus_dir, f"synthetic{i:05d}.{file_type}")
+        WRITERS[file_type](path, text)
+        corpus.append({"path": path, "type": file_type, "query": f"{codename} {i} status report",
+                       "tenant": f"tenant{i % tenant_count}", "doc_id": None})
+    return corpus
+
+
+# ---------------- Measurements ----------------
+def percentiles(samples_ms):
+    if not samples_ms:
+        return {}
+    values = np.percentile(samples_ms, [50, 95, 99])
+    return {"p50_ms": round(float(values[0]), 3), "p95_ms": round(float(values[1]), 3),
+            "p99_ms": round(float(values[2]), 3), "mean_ms": round(float(np.mean(samples_ms)), 3)}
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def shard_size(rag_utils, tenant):
+    shard = rag_utils.get_shard(tenant)
+    return int(shard["index"].ntotal) if shard else 0
+
+
+def bench_ingest(rag_utils, corpus):
+    tenants = sorted({doc["tenant"] for doc in corpus})
+    per_type = {t: [] for t in FILE_TYPES}
+    start = time.perf_counter()
+    for doc in corpus:
+        before = shard_size(rag_utils, doc["tenant"])
+        t0 = time.perf_counter()
+        rag_utils.add_document(doc["path"], tenant=doc["tenant"], persist=False)
+        per_type[doc["type"]].append((time.perf_counter() - t0) * 1000)
+        doc["doc_id"] = before if shard_size(rag_utils, doc["tenant"]) > before else None
+    for tenant in tenants:
+        rag_utils.save_index(tenant)
+    elapsed = time.perf_counter() - start
+    return {
+        "documents": len(corpus),
+        "tenants": len(tenants),
+        "indexed": sum(shard_size(rag_utils, tenant) for tenant in tenants),
+        "seconds": round(elapsed, 3),
+        "docs_per_sec": round(len(corpus) / elapsed, 2) if elapsed else None,
+        "per_type_latency": {t: percentiles(v) for t, v in per_type.items() if v},
+    }
+
+
+def bench_embed(rag_utils, corpus, batch_size):
+    texts = [rag_utils.extract_text_from_file(doc["path"]) for doc in corpus]
+    rag_utils.get_embedder().encode(texts[:1])  # warm-up
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        rag_utils.get_embedder().encode(texts[i:i + batch_size])
+    elapsed = time.perf_counter() - start
+    return {"vectors": len(texts), "batch_size": batch_size, "seconds": round(elapsed, 3),
+            "vectors_per_sec": round(len(texts) / elapsed, 2) if elapsed else None}
+
+
+def bench_query(rag_utils, corpus, query_count, top_k, seed, rerank=False):
+    rng = random.Random(seed)
+    targets = [rng.randrange(len(corpus)) for _ in range(query_count)]
+    if rerank:
+        rag_utils.get_reranker()  # keep model loading out of the latencies
+    latencies, hits = [], 0
+    for target in targets:
+        doc = corpus[target]
+        rag_utils.clear_search_cache()  # measure uncached queries
+        t0 = time.perf_counter()
+        results = rag_utils.search_documents(doc["query"], top_k=top_k, rerank=rerank, tenants=[doc["tenant"]])
+        latencies.append((time.perf_counter() - t0) * 1000)
+        if any(r["tenant"] == doc["tenant"] and r["doc_id"] == doc["doc_id"] for r in results):
+            hits += 1
+    return {"queries": query_count, "top_k": top_k, **percentiles(latencies),
+            f"recall_at_{top_k}": round(hits / query_count, 4) if query_count else None}
+
+
+def bench_chat(llm_chat, corpus, iterations):
+    drive_service = StubDriveService()
+    calendar_service = StubCalendarService()
+    summarize_target = os.path.basename(corpus[0]["path"])
+    intents = {
+        "available_files": "What files are available for search?",
+        "summarize_file": f"Summarize file {summarize_target}",
+        "drive_list": "List files 10",
+        "calendar_list": "List my upcoming events",
+        "schedule_event": "Schedule event name : Sync date: 01/02/2030 time: 10:00 AM",
+        "llm_chat": "Tell me something fun about benchmarks",
+    }
+    results = {}
+    for name, message in intents.items():
+        latencies = []
+        for _ in range(iterations):
+            t0 = time.perf_counter()
+            llm_chat.generate_response(message, drive_service, calendar_service, throttle=False)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        results[name] = percentiles(latencies)
+    return results
+
+
+# ---------------- Reporting ----------------
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def flatten(data, prefix=""):
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(current, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    old, new = flatten(baseline["metrics"]), flatten(current["metrics"])
+    print(f"\nComparison against {baseline.get('git_revision')} ({baseline_path}):")
+    for name in sorted(new):
+        if name in old and old[name]:
+            change = (new[name] - old[name]) / old[name] * 100
+            print(f"  {name:<55} {old[name]:>12} -> {new[name]:>12} ({change:+.1f}%)")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark ingestion, retrieval and chat dispatch.")
+    parser.add_argument("--docs", type=int, default=100, help="number of synthetic documents")
+    parser.add_argument("--words", type=int, default=300, help="words per synthetic document")
+    parser.add_argument("--types", default="txt,docx,pdf", help="comma-separated file types to generate")
+    parser.add_argument("--tenants", type=int, default=1, help="spread documents over this many index shards")
+    parser.add_argument("--queries", type=int, default=200, help="number of search queries")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--rerank", action="store_true", help="also benchmark cross-encoder reranked search")
+    parser.add_argument("--batch-size", type=int, default=32, help="embedding batch size")
+    parser.add_argument("--chat-iterations", type=int, default=50)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="simulated Gemini latency in seconds")
+    parser.add_argument("--stub-embeddings", action="store_true", help="use a hashing embedder instead of the model")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--compare", help="previous results JSON to diff against")
+    parser.add_argument("--keep-corpus", action="store_true")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    file_types = [t.strip() for t in args.types.split(",") if t.strip()]
+    unknown = [t for t in file_types if t not in WRITERS]
+    if unknown or not file_types:
+        raise SystemExit(f"Unsupported file types: {unknown or args.types}")
+
+    os.environ.setdefault("GEMINI_API_KEY", "offline-benchmark")
+    import rag_utils
+    import llm_chat
+    import tenants
+    llm_chat.model = StubGeminiModel(args.llm_latency)
+    if args.stub_embeddings:
+        rag_utils.embedding_model = HashingEmbedder(rag_utils.dimension)
+        rag_utils.reranker = StubCrossEncoder()
+    rag_utils.get_embedder()  # keep model loading out of the ingest timings
+
+    corpus_dir = tempfile.mkdtemp(prefix="rag_bench_")
+    rag_utils.INDEX_DIR = os.path.join(corpus_dir, "index")
+    tenants.UPLOADS_DIR = corpus_dir  # the chat benchmark lists and summarizes the corpus
+    try:
+        corpus = build_corpus(corpus_dir, args.docs, args.words, file_types, args.seed, max(args.tenants, 1))
+        metrics = {
+            "ingest": bench_ingest(rag_utils, corpus),
+            "embed": bench_embed(rag_utils, corpus, args.batch_size),
+            "query": bench_query(rag_utils, corpus, args.queries, args.top_k, args.seed),
+            "rerank_query": bench_query(rag_utils, corpus, args.queries, args.top_k, args.seed, rerank=True)
+            if args.rerank else {},
+            "chat": bench_chat(llm_chat, corpus, args.chat_iterations) if corpus else {},
+        }
+        metrics["peak_rss_mb"] = peak_rss_mb()
+    finally:
+        if args.keep_corpus:
+            print(f"Corpus kept at {corpus_dir}")
+        else:
+            shutil.rmtree(corpus_dir, ignore_errors=True)
+
+    results = {
+        "git_revision": git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "metrics": metrics,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results["metrics"], indent=2))
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
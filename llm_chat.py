@@ -11,6 +11,7 @@ import html
 import time
 from google_drive import list_files, download_file, preview_file, get_drive_service
 from google_calendar import list_events, create_task, list_tasks, schedule_event, get_calendar_service
+from tenants import uploads_dir
 
 # Initialize Gemini API
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "")
@@ -20,8 +21,6 @@ genai.configure(api_key=GEMINI_API_KEY)
 model = genai.GenerativeModel("gemini-1.5-flash")
 last_request_time = 0
 
-UPLOADS_DIR = "uploads"
-
 def normalize_input(user_input):
     translator = str.maketrans('', '', string.punctuation)
     return user_input.translate(translator).lower()
@@ -41,17 +40,20 @@ def summarize_text(text):
     except Exception as e:
         return f"Error summarizing text: {e}"
 
-def generate_response(user_input, drive_service=None, calendar_service=None):
+def generate_response(user_input, drive_service=None, calendar_service=None, stream=False, throttle=True, tenant=None):
     global last_request_time
     normalized_input = normalize_input(user_input)
     words = normalized_input.split()
+    tenant_uploads = uploads_dir(tenant)
 
     # ---------------- RAG-Based File Search ----------------
     if "what files are available for search" in normalized_input:
-        if not os.path.exists(UPLOADS_DIR):
+        if not os.path.exists(tenant_uploads):
             return "No files uploaded yet."
 
-        files = os.listdir(UPLOADS_DIR)
+        # Skip tenant subfolders and in-progress uploads (dotfiles)
+        files = [f for f in os.listdir(tenant_uploads)
+                 if not f.startswith(".") and os.path.isfile(os.path.join(tenant_uploads, f))]
         if not files:
             return "No files uploaded yet."
 
@@ -62,14 +64,14 @@ def generate_response(user_input, drive_service=None, calendar_service=None):
         query = " ".join(words[words.index("file") + 1:]).strip().lower()
 
         # ✅ Debugging: Print available files
-        local_files = {f.lower().replace(".", "").replace(" ", ""): f for f in os.listdir(UPLOADS_DIR)}
+        local_files = {f.lower().replace(".", "").replace(" ", ""): f for f in os.listdir(tenant_uploads)} if os.path.exists(tenant_uploads) else {}
         print(f"DEBUG: Available files for search → {list(local_files.keys())}")
 
         # ✅ Case-insensitive, punctuation-free matching
         target_file = local_files.get(query.replace(".", "").replace(" ", ""), None)
 
         if target_file:
-            file_path = os.path.join(UPLOADS_DIR, target_file)
+            file_path = os.path.join(tenant_uploads, target_file)
             content = ""
 
             # ✅ PDF Summarization
@@ -148,16 +150,32 @@ def generate_response(user_input, drive_service=None, calendar_service=None):
             return "Invalid format. Please use: 'Schedule event name : <Event Name> date: <dd/mm/yyyy> time: <xx:yy AM/PM>'"
 
     # ---------------- Default LLM Chat Response ----------------
-    if time.time() - last_request_time < 2:
+    # throttle=False for callers that bound concurrency themselves (api.py)
+    if throttle and time.time() - last_request_time < 2:
         return "Hold on! Processing... 😅"
 
     last_request_time = time.time()
     try:
         prompt = f"You’re a chill, helpful buddy. Keep it simple and fun.\nUser: {user_input}"
+        if stream:
+            return model.generate_content(prompt, stream=True)
         return model.generate_content(prompt).text.strip()
     except Exception as e:
         return f"LLM error: {e}"
 
+# Yields the reply in chunks; only the default LLM chat is streamed, other intents arrive whole
+def generate_response_stream(user_input, drive_service=None, calendar_service=None, throttle=True, tenant=None):
+    response = generate_response(user_input, drive_service, calendar_service, stream=True, throttle=throttle, tenant=tenant)
+    if isinstance(response, str):
+        yield response
+        return
+    try:
+        for chunk in response:
+            if chunk.text:
+                yield chunk.text
+    except Exception as e:
+        yield f"LLM error: {e}"
+
 # ---------------- Main Execution (Terminal Testing) ----------------
 if __name__ == "__main__":
     drive_service = get_drive_service()
@@ -1,26 +1,51 @@
 import faiss
+import json
+import os
+import threading
+import time
 import numpy as np
 import pdfplumber
 import docx
-from sentence_transformers import SentenceTransformer
+from collections import OrderedDict
+from tenants import DEFAULT_TENANT, validate_tenant
 
-# Load embedding model
-embedding_model = SentenceTransformer("all-MiniLM-L6-v2")  # Small, efficient model
-
-# Store document data (in-memory for now)
-document_store = {}
+# Embedding model, loaded on first use (see get_embedder)
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"  # Small, efficient model
+embedding_model = None
 
 # FAISS index for similarity search
 dimension = 384  # Matching the embedding model output
-index = faiss.IndexFlatL2(dimension)
 
-# Extract text from different file types
+# One index shard per tenant, persisted under INDEX_DIR/<tenant>/ and shared by API workers
+INDEX_DIR = os.environ.get("RAG_INDEX_DIR", "index")
+INDEX_FILE = "faiss.index"
+STORE_FILE = "documents.json"
+
+# Loaded shards, least recently used first; idle or excess shards are dropped from memory
+MAX_LOADED_SHARDS = int(os.environ.get("RAG_MAX_LOADED_SHARDS", "8"))
+SHARD_IDLE_SECONDS = float(os.environ.get("RAG_SHARD_IDLE_SECONDS", "900"))
+shards = OrderedDict()
+shards_lock = threading.RLock()
+
+# Optional cross-encoder reranking (CPU), loaded on first use
+RERANKER_MODEL = os.environ.get("RAG_RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_BATCH_SIZE = 16  # Candidates scored per cross-encoder pass
+RERANK_MAX_CANDIDATES = 64  # Deepest FAISS rank considered
+RERANK_MARGIN = 3.0  # Logit gap that counts as decisive
+RERANK_MAX_CHARS = 2000  # Cross-encoder only reads the first ~512 tokens anyway
+RESULT_CACHE_SIZE = 256  # Per shard
+reranker = None
+
+SUPPORTED_TYPES = (".pdf", ".docx", ".txt")
+
+# Extract text from different file types (extensions match case-insensitively)
 def extract_text_from_file(file_path):
-    if file_path.endswith(".pdf"):
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == ".pdf":
         return extract_text_from_pdf(file_path)
-    elif file_path.endswith(".docx"):
+    elif extension == ".docx":
         return extract_text_from_word(file_path)
-    elif file_path.endswith(".txt"):
+    elif extension == ".txt":
         return extract_text_from_txt(file_path)
     else:
         return "Unsupported file type"
@@ -40,37 +65,327 @@ def extract_text_from_txt(file_path):
     with open(file_path, "r", encoding="utf-8") as file:
         return file.read()
 
+# ---------------- Tenant Shards ----------------
+def shard_dir(tenant):
+    return os.path.join(INDEX_DIR, validate_tenant(tenant))
+
+def new_shard():
+    return {"index": faiss.IndexFlatL2(dimension), "documents": {}, "sources": {}, "cache": OrderedDict(), "generation": 0,
+            "lock": threading.RLock(), "version": None, "mmap": False, "dirty": False, "last_used": 0.0}
+
+# Lazy-load a tenant's shard from disk. Unknown tenants return None unless create=True,
+# so looking up made-up names never pushes real shards out of memory.
+def get_shard(tenant=DEFAULT_TENANT, mmap=False, create=False):
+    shard_dir(tenant)
+    with shards_lock:
+        shard = shards.get(tenant)
+        if shard is None:
+            shard = new_shard()
+            if not _read_shard(tenant, shard, mmap) and not create:
+                return None
+            shards[tenant] = shard
+        shards.move_to_end(tenant)
+        shard["last_used"] = time.monotonic()
+        evict_shards()
+        return shard
+
+# Like get_shard, but returns the shard with its lock held. Retries if the shard was
+# evicted before the lock was taken, so changes never land on a detached copy.
+def _acquire_shard(tenant, mmap=False, create=False):
+    while True:
+        shard = get_shard(tenant, mmap=mmap, create=create)
+        if shard is None:
+            return None
+        shard["lock"].acquire()
+        with shards_lock:
+            if shards.get(tenant) is shard:
+                return shard
+        shard["lock"].release()
+
+# Drop idle and least recently used shards from memory, saving any unsaved additions first
+def evict_shards():
+    with shards_lock:
+        now = time.monotonic()
+        for tenant in list(shards)[:-1]:  # Never evict the shard just requested
+            shard = shards[tenant]
+            if len(shards) <= MAX_LOADED_SHARDS and now - shard["last_used"] < SHARD_IDLE_SECONDS:
+                continue
+            if not shard["lock"].acquire(blocking=False):
+                continue  # In use, so not idle
+            try:
+                if shard["dirty"]:
+                    _write_shard(tenant, shard)
+                del shards[tenant]
+            finally:
+                shard["lock"].release()
+
+def loaded_tenants():
+    with shards_lock:
+        return list(shards)
+
+# Index a file for a tenant. Documents are keyed by file name (source), so re-ingesting a
+# file replaces its earlier version instead of adding a copy. Returns "added", "updated" or
+# "unchanged"; raises ValueError if the file type is unsupported or no text can be read.
+def index_document(file_path, tenant=DEFAULT_TENANT, persist=True, source=None):
+    source = source or os.path.basename(file_path)
+    if not file_path.lower().endswith(SUPPORTED_TYPES):
+        raise ValueError(f"Unsupported file type for '{source}'. Please use a PDF, TXT, or DOCX file.")
+    try:
+        text = extract_text_from_file(file_path)
+    except Exception as e:
+        raise ValueError(f"Could not read '{source}': {e}") from e
+    if not text.strip():
+        raise ValueError(f"Could not extract text from '{source}'.")
+
+    # Convert text to embeddings
+    text_embedding = get_embedder().encode([text])[0]  # Get vector representation
+    text_embedding = np.array([text_embedding]).astype("float32")
+
+    shard = _acquire_shard(tenant, create=True)
+    try:
+        if shard["mmap"] or is_mapped(shard["index"]):
+            _read_shard(tenant, shard, mmap=False)  # Memory-mapped shards are read-only
+
+        doc_id = shard["sources"].get(source)
+        if doc_id is not None and shard["documents"].get(doc_id) == text:
+            return "unchanged"
+
+        if doc_id is None:
+            doc_id = len(shard["documents"])  # Assign unique ID within the tenant
+            shard["index"].add(text_embedding)
+            status = "added"
+        else:
+            _replace_vector(shard["index"], doc_id, text_embedding)
+            status = "updated"
+        shard["documents"][doc_id] = text
+        shard["sources"][source] = doc_id
+
+        _invalidate(shard)
+        shard["dirty"] = True
+        if persist:
+            _write_shard(tenant, shard)
+    finally:
+        shard["lock"].release()
+    return status
+
+# IndexFlat can't update in place, so rebuild it with the one vector swapped (ids stay the same)
+def _replace_vector(faiss_index, doc_id, embedding):
+    vectors = faiss_index.reconstruct_n(0, faiss_index.ntotal)
+    vectors[doc_id] = embedding[0]
+    faiss_index.reset()
+    faiss_index.add(vectors)
+
 # Add document to FAISS and store text
-def add_document(file_path):
-    text = extract_text_from_file(file_path)
-    if text.strip():
-        doc_id = len(document_store)  # Assign unique ID
-        document_store[doc_id] = text
-        
-        # Convert text to embeddings
-        text_embedding = embedding_model.encode([text])[0]  # Get vector representation
-        text_embedding = np.array([text_embedding]).astype("float32")
-
-        # Add to FAISS index
-        index.add(text_embedding)
-        
-        return f"✅ File '{file_path}' added to knowledge base."
-    return "❌ Could not extract text."
-
-# Perform a search query
-def search_documents(query, top_k=3):
-    query_embedding = embedding_model.encode([query])[0]
-    query_embedding = np.array([query_embedding]).astype("float32")
-
-    if index.ntotal == 0:
-        return "No documents found. Please upload a file first."
-
-    # Search in FAISS
-    distances, indices = index.search(query_embedding, top_k)
+def add_document(file_path, tenant=DEFAULT_TENANT, persist=True):
+    try:
+        status = index_document(file_path, tenant=tenant, persist=persist)
+    except ValueError as e:
+        return f"❌ {e}"
+    if status == "updated":
+        return f"🔄 File '{file_path}' updated in knowledge base."
+    if status == "unchanged":
+        return f"✅ File '{file_path}' is already in the knowledge base."
+    return f"✅ File '{file_path}' added to knowledge base."
 
+# Fan out over the tenants' shards and merge; returns [{"tenant", "doc_id", "text", "score", "distance"}], best first
+def search_documents(query, top_k=3, rerank=False, min_score=None, tenants=None):
+    query_embedding = None
     results = []
-    for idx in indices[0]:
-        if idx in document_store:
-            results.append(document_store[idx])
+    key = (query, top_k, rerank)
+    for tenant in dict.fromkeys(tenants or [DEFAULT_TENANT]):
+        shard = _acquire_shard(tenant)
+        if shard is None:
+            continue
+        try:
+            empty = shard["index"].ntotal == 0
+            cached = shard["cache"].get(key)
+            generation = shard["generation"]
+        finally:
+            shard["lock"].release()
+        if empty:
+            continue
+
+        if cached is None:
+            if query_embedding is None:
+                query_embedding = get_embedder().encode([query])[0]
+                query_embedding = np.array([query_embedding]).astype("float32")
+            if rerank:
+                cached = tuple(_rerank(shard, query, query_embedding, top_k))
+            else:
+                cached = tuple(_vector_search(shard, query_embedding, top_k))
+            with shard["lock"]:
+                if shard["generation"] == generation:  # Don't cache results from before an add/reload
+                    _cache_put(shard, key, cached)
+        results.extend(dict(result, tenant=tenant) for result in cached)
+
+    results.sort(key=lambda result: result["score"], reverse=True)
+    results = results[:top_k]
+    if min_score is not None:
+        results = [result for result in results if result["score"] >= min_score]
+    return results
+
+def _cache_put(shard, key, value):
+    cache = shard["cache"]
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > RESULT_CACHE_SIZE:
+        cache.popitem(last=False)
+
+def _invalidate(shard):
+    shard["cache"].clear()
+    shard["generation"] += 1
+
+# Vector-only score: 1 / (1 + L2 distance), higher is better
+def _vector_search(shard, query_embedding, top_k):
+    with shard["lock"]:
+        candidates = _vector_candidates(shard, query_embedding, 0, top_k)
+    return [{"doc_id": doc_id, "text": text, "score": 1.0 / (1.0 + distance), "distance": distance}
+            for doc_id, distance, text in candidates]
+
+# FAISS hits ranked [start, end) with their text, skipping padding (-1) and ids missing from the store.
+# Call with the shard lock held.
+def _vector_candidates(shard, query_embedding, start, end):
+    documents = shard["documents"]
+    distances, indices = shard["index"].search(query_embedding, end)
+    return [(int(idx), float(dist), documents[int(idx)])
+            for idx, dist in zip(indices[0][start:end], distances[0][start:end]) if int(idx) in documents]
+
+# Cross-encoder reranking over a growing FAISS candidate set. Candidates are copied under
+# the shard lock and scored outside it, so ingest and other searches aren't blocked.
+def _rerank(shard, query, query_embedding, top_k):
+    model = get_reranker()
+    step = max(RERANK_BATCH_SIZE, top_k + 1)
+    scored = []
+    depth = 0
+    while True:
+        with shard["lock"]:
+            max_depth = min(RERANK_MAX_CANDIDATES, shard["index"].ntotal)
+            if depth >= max_depth:
+                break
+            batch = _vector_candidates(shard, query_embedding, depth, min(depth + step, max_depth))
+        depth = min(depth + step, max_depth)
+        if not batch:
+            break
+
+        pairs = [(query, text[:RERANK_MAX_CHARS]) for _, _, text in batch]
+        scores = model.predict(pairs, batch_size=RERANK_BATCH_SIZE)
+        scored.extend({"doc_id": doc_id, "text": text, "score": float(score), "distance": distance}
+                      for (doc_id, distance, text), score in zip(batch, scores))
+        scored.sort(key=lambda result: result["score"], reverse=True)
+
+        # Stop expanding once the top_k clearly lead the rest, or this batch couldn't compete
+        if len(scored) > top_k:
+            cutoff = scored[top_k - 1]["score"] - RERANK_MARGIN
+            if scored[top_k]["score"] <= cutoff or max(scores) < cutoff:
+                break
+
+    return scored[:top_k]
+
+# Lazy-load the models so importing this module stays cheap and callers (tests, the
+# benchmark) can install offline stand-ins first
+def get_embedder():
+    global embedding_model
+    if embedding_model is None:
+        from sentence_transformers import SentenceTransformer
+        embedding_model = SentenceTransformer(EMBEDDING_MODEL)
+    return embedding_model
+
+# Plain vector search never pays for the cross-encoder
+def get_reranker():
+    global reranker
+    if reranker is None:
+        from sentence_transformers import CrossEncoder
+        reranker = CrossEncoder(RERANKER_MODEL, device="cpu")
+    return reranker
+
+def clear_search_cache(tenant=None):
+    with shards_lock:
+        targets = [shards[tenant]] if tenant in shards else ([] if tenant else list(shards.values()))
+    for shard in targets:
+        with shard["lock"]:
+            shard["cache"].clear()
+
+# Persist a shard; files are swapped in atomically so readers never see a partial write
+def save_index(tenant=DEFAULT_TENANT):
+    shard = _acquire_shard(tenant)
+    if shard is None:
+        return
+    try:
+        _write_shard(tenant, shard)
+    finally:
+        shard["lock"].release()
+
+def _write_shard(tenant, shard):
+    directory = shard_dir(tenant)
+    os.makedirs(directory, exist_ok=True)
+    index_path = os.path.join(directory, INDEX_FILE)
+    store_path = os.path.join(directory, STORE_FILE)
+
+    with shard["lock"]:
+        faiss.write_index(shard["index"], index_path + ".tmp")
+        with open(store_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"documents": shard["documents"], "sources": shard["sources"]}, f)
+
+        os.replace(store_path + ".tmp", store_path)
+        os.replace(index_path + ".tmp", index_path)
+        shard["version"] = index_version(tenant)
+        shard["dirty"] = False
+
+# (Re)load a shard from disk; mmap=True maps the vectors read-only so workers share pages
+def load_index(tenant=DEFAULT_TENANT, mmap=False):
+    with shards_lock:
+        if tenant not in shards:
+            return get_shard(tenant, mmap=mmap) is not None  # Reads it from disk
+    shard = _acquire_shard(tenant, mmap=mmap)
+    if shard is None:
+        return False
+    try:
+        loaded = _read_shard(tenant, shard, mmap)
+        _invalidate(shard)
+    finally:
+        shard["lock"].release()
+    return loaded
+
+# Reload a shard only if another process saved a newer version
+def refresh_shard(tenant=DEFAULT_TENANT, mmap=False):
+    shard = get_shard(tenant, mmap=mmap)
+    version = index_version(tenant)
+    if shard is not None and version is not None and version != shard["version"]:
+        load_index(tenant, mmap=mmap)
+
+def _read_shard(tenant, shard, mmap):
+    directory = shard_dir(tenant)
+    index_path = os.path.join(directory, INDEX_FILE)
+    store_path = os.path.join(directory, STORE_FILE)
+    if not os.path.exists(index_path) or not os.path.exists(store_path):
+        return False
+
+    version = index_version(tenant)
+    with open(store_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data.get("documents"), dict):
+        data = {"documents": data, "sources": {}}  # Shards saved before documents were keyed by file name
+    store = {int(doc_id): text for doc_id, text in data["documents"].items()}
+    sources = {source: int(doc_id) for source, doc_id in data["sources"].items()}
+
+    loaded = None
+    if mmap and hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        try:
+            # IO_FLAG_MMAP only maps IVF lists; flat codes need IO_FLAG_MMAP_IFC
+            loaded = faiss.read_index(index_path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            loaded = None  # Index type without mmap support
+    if loaded is None:
+        loaded = faiss.read_index(index_path)
+
+    shard.update(index=loaded, documents=store, sources=sources, version=version, mmap=is_mapped(loaded), dirty=False)
+    return True
+
+# True when the vectors point into a mapped file; add() on such an index aborts the process
+def is_mapped(faiss_index):
+    codes = getattr(faiss_index, "codes", None)
+    return codes is not None and hasattr(codes, "is_owned") and not codes.is_owned
 
-    return results if results else ["No relevant documents found."]
+def index_version(tenant=DEFAULT_TENANT):
+    index_path = os.path.join(shard_dir(tenant), INDEX_FILE)
+    return os.stat(index_path).st_mtime_ns if os.path.exists(index_path) else None
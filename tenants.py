@@ -0,0 +1,16 @@
+import os
+import re
+
+# Tenant ids name on-disk directories (index shards, uploads), so keep them path-safe
+DEFAULT_TENANT = "default"
+TENANT_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+UPLOADS_DIR = "uploads"
+
+def validate_tenant(tenant):
+    if not isinstance(tenant, str) or not TENANT_PATTERN.fullmatch(tenant):
+        raise ValueError(f"Invalid tenant id: {tenant!r}")
+    return tenant
+
+# Each tenant's uploads live in their own subfolder; no tenant means the shared folder
+def uploads_dir(tenant=None):
+    return os.path.join(UPLOADS_DIR, validate_tenant(tenant)) if tenant else UPLOADS_DIR
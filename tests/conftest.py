@@ -0,0 +1,41 @@
+import importlib
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmark import HashingEmbedder, StubCrossEncoder  # noqa: E402  (same offline stand-ins as the benchmark)
+
+# Only txt files are used in the tests
+for name in ("pdfplumber", "docx"):
+    try:
+        importlib.import_module(name)
+    except ImportError:
+        sys.modules[name] = types.ModuleType(name)
+
+
+@pytest.fixture
+def rag(tmp_path, monkeypatch):
+    rag_utils = importlib.import_module("rag_utils")
+    monkeypatch.setattr(rag_utils, "INDEX_DIR", str(tmp_path / "index"))
+    monkeypatch.setattr(rag_utils, "MAX_LOADED_SHARDS", 8)
+    monkeypatch.setattr(rag_utils, "SHARD_IDLE_SECONDS", 900)
+    monkeypatch.setattr(rag_utils, "embedding_model", HashingEmbedder(rag_utils.dimension))
+    monkeypatch.setattr(rag_utils, "reranker", StubCrossEncoder())
+    rag_utils.shards.clear()
+    yield rag_utils
+    rag_utils.shards.clear()
+
+
+@pytest.fixture
+def write_doc(tmp_path):
+    counter = iter(range(10**6))
+
+    def write(text, name=None):
+        path = tmp_path / (name or f"doc{next(counter)}.txt")
+        path.write_text(text, encoding="utf-8")
+        return str(path)
+    return write
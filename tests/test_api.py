@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+pytest.importorskip("httpx")
+api = pytest.importorskip("api")
+from fastapi.testclient import TestClient
+
+import tenants
+
+
+@pytest.fixture
+def client(rag, tmp_path, monkeypatch):
+    monkeypatch.setattr(tenants, "UPLOADS_DIR", str(tmp_path / "uploads"))
+    return TestClient(api.app)  # Not used as a context manager, so the Google lifespan doesn't run
+
+
+def upload(client, name, content, tenant="alice"):
+    return client.post("/ingest", files={"file": (name, content, "text/plain")}, headers={"X-Tenant": tenant})
+
+
+def search(client, query, tenant="alice", **params):
+    return client.post("/search", json={"query": query, **params}, headers={"X-Tenant": tenant})
+
+
+def uploaded_files(tenant):
+    directory = tenants.uploads_dir(tenant)
+    return sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+
+
+def test_tenants_only_see_their_own_documents(client):
+    response = upload(client, "notes.txt", b"apple banana")
+    assert response.status_code == 200
+    assert response.json()["tenant"] == "alice"
+
+    assert search(client, "apple banana", tenant="bob").json()["results"] == []
+    results = search(client, "apple banana").json()["results"]
+    assert [(r["tenant"], r["text"]) for r in results] == [("alice", "apple banana")]
+    assert uploaded_files("alice") == ["notes.txt"]
+    assert uploaded_files("bob") == []
+
+
+@pytest.mark.parametrize("tenant", ["../bob", "a b", "x" * 65])
+def test_invalid_tenant_header_is_rejected(client, tenant):
+    assert upload(client, "notes.txt", b"apple", tenant=tenant).status_code == 400
+    assert search(client, "apple", tenant=tenant).status_code == 400
+
+
+def test_reuploading_a_file_replaces_it(client):
+    assert upload(client, "notes.txt", b"apple banana").json()["status"] == "added"
+    assert upload(client, "notes.txt", b"apple banana").json()["status"] == "unchanged"
+    assert upload(client, "notes.txt", b"zebra walrus").json()["status"] == "updated"
+
+    results = search(client, "zebra walrus", top_k=5).json()["results"]
+    assert [r["text"] for r in results] == ["zebra walrus"]
+    assert uploaded_files("alice") == ["notes.txt"]
+
+
+def test_file_types_are_case_insensitive(client):
+    assert upload(client, "NOTES.TXT", b"apple banana").status_code == 200
+    assert upload(client, "notes.md", b"apple banana").status_code == 400
+
+
+@pytest.mark.parametrize("content", [b"\xff\xfe\xfa not utf-8", b"   "])
+def test_unreadable_uploads_are_rejected_and_removed(client, content):
+    assert upload(client, "bad.txt", content).status_code == 422
+    assert uploaded_files("alice") == []
+    assert search(client, "utf", top_k=5).json()["results"] == []
+
+
+def test_top_k_is_validated(client):
+    assert search(client, "apple", top_k=0).status_code == 422
+    assert search(client, "apple", top_k=api.MAX_TOP_K + 1).status_code == 422
@@ -0,0 +1,204 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip("faiss")
+
+
+def stored_documents(rag, tenant):
+    rag.shards.pop(tenant, None)
+    shard = rag.get_shard(tenant)
+    return shard["documents"] if shard else {}
+
+
+def test_evicting_dirty_shard_persists_it(rag, write_doc):
+    rag.MAX_LOADED_SHARDS = 1
+    rag.add_document(write_doc("alpha beta"), tenant="a", persist=False)
+    assert rag.get_shard("a")["dirty"]
+
+    rag.add_document(write_doc("gamma delta"), tenant="b", persist=False)
+
+    assert rag.loaded_tenants() == ["b"]
+    assert stored_documents(rag, "a") == {0: "alpha beta"}
+
+
+def test_add_racing_eviction_is_not_lost(rag, write_doc, monkeypatch):
+    rag.add_document(write_doc("alpha beta"), tenant="a")
+    original_get_shard = rag.get_shard
+    evicted = []
+
+    # Evict the shard right after the lookup, before add_document takes its lock
+    def get_shard_then_evict(tenant, *args, **kwargs):
+        shard = original_get_shard(tenant, *args, **kwargs)
+        if not evicted:
+            evicted.append(rag.shards.pop(tenant))
+        return shard
+
+    monkeypatch.setattr(rag, "get_shard", get_shard_then_evict)
+    result = rag.add_document(write_doc("gamma delta"), tenant="a")
+    monkeypatch.setattr(rag, "get_shard", original_get_shard)
+
+    assert result.startswith("✅")
+    assert evicted and evicted[0]["documents"] == {0: "alpha beta"}
+    assert stored_documents(rag, "a") == {0: "alpha beta", 1: "gamma delta"}
+
+
+def test_search_merges_top_k_across_tenants(rag, write_doc):
+    rag.add_document(write_doc("apple banana cherry"), tenant="a")
+    rag.add_document(write_doc("zebra yak walrus"), tenant="a")
+    rag.add_document(write_doc("apple banana"), tenant="b")
+    rag.add_document(write_doc("apple pie recipe"), tenant="c")
+
+    results = rag.search_documents("apple banana", top_k=2, tenants=["a", "b"])
+
+    assert [(r["tenant"], r["doc_id"]) for r in results] == [("b", 0), ("a", 0)]
+    assert results[0]["score"] >= results[1]["score"]
+    assert all(r["tenant"] != "c" for r in rag.search_documents("apple pie", top_k=5, tenants=["a", "b"]))
+
+
+def test_rerank_merges_across_tenants(rag, write_doc):
+    rag.add_document(write_doc("apple"), tenant="a")
+    rag.add_document(write_doc("apple banana cherry"), tenant="b")
+
+    results = rag.search_documents("apple banana cherry", top_k=1, rerank=True, tenants=["a", "b"])
+
+    assert [(r["tenant"], r["doc_id"], r["score"]) for r in results] == [("b", 0, 3.0)]
+
+
+def test_unknown_tenant_is_not_loaded(rag):
+    assert rag.search_documents("anything", tenants=["ghost"]) == []
+    assert "ghost" not in rag.loaded_tenants()
+    with pytest.raises(ValueError):
+        rag.search_documents("anything", tenants=["../etc"])
+
+
+def test_cache_is_invalidated_on_add(rag, write_doc):
+    rag.add_document(write_doc("apple banana"), tenant="a")
+    assert len(rag.search_documents("apple", top_k=5, tenants=["a"])) == 1
+
+    rag.add_document(write_doc("apple pie"), tenant="a")
+
+    assert len(rag.search_documents("apple", top_k=5, tenants=["a"])) == 2
+
+
+def test_cache_is_invalidated_on_reload(rag, write_doc):
+    rag.add_document(write_doc("apple banana"), tenant="a")
+    assert len(rag.search_documents("apple", top_k=5, tenants=["a"])) == 1
+
+    # Another process adds to the shard on disk while this one holds a stale cached copy
+    stale = rag.shards.pop("a")
+    rag.add_document(write_doc("apple pie"), tenant="a")
+    rag.shards["a"] = stale
+    assert len(rag.search_documents("apple", top_k=5, tenants=["a"])) == 1
+
+    rag.refresh_shard("a")
+
+    assert len(rag.search_documents("apple", top_k=5, tenants=["a"])) == 2
+
+
+def test_mapped_shard_is_reloaded_before_add(rag, write_doc):
+    rag.add_document(write_doc("apple banana"), tenant="a")
+    rag.shards.clear()
+    rag.load_index("a", mmap=True)
+    assert rag.get_shard("a")["mmap"]
+
+    rag.add_document(write_doc("apple pie"), tenant="a")
+
+    assert not rag.is_mapped(rag.get_shard("a")["index"])
+    assert stored_documents(rag, "a") == {0: "apple banana", 1: "apple pie"}
+
+
+def test_extensions_match_case_insensitively(rag, tmp_path):
+    upper = tmp_path / "NOTES.TXT"
+    upper.write_text("apple banana", encoding="utf-8")
+    unsupported = tmp_path / "notes.md"
+    unsupported.write_text("apple banana", encoding="utf-8")
+
+    assert rag.add_document(str(upper), tenant="a").startswith("✅")
+    assert rag.add_document(str(unsupported), tenant="a").startswith("❌")
+    assert stored_documents(rag, "a") == {0: "apple banana"}
+
+
+def test_reingesting_a_file_replaces_it(rag, write_doc):
+    path = write_doc("apple banana", name="notes.txt")
+    assert rag.index_document(path, tenant="a") == "added"
+    assert rag.index_document(path, tenant="a") == "unchanged"
+
+    write_doc("zebra walrus", name="notes.txt")
+    assert rag.index_document(path, tenant="a") == "updated"
+
+    assert stored_documents(rag, "a") == {0: "zebra walrus"}
+    results = rag.search_documents("zebra walrus", top_k=5, tenants=["a"])
+    assert [(r["doc_id"], r["text"]) for r in results] == [(0, "zebra walrus")]
+    assert results[0]["distance"] == pytest.approx(0.0, abs=1e-5)
+
+
+def test_source_name_keys_documents(rag, write_doc):
+    rag.index_document(write_doc("apple banana"), tenant="a", source="report.txt")
+    rag.index_document(write_doc("apple pie"), tenant="a", source="report.txt")
+
+    assert stored_documents(rag, "a") == {0: "apple pie"}
+
+
+def test_unreadable_files_raise_and_index_nothing(rag, write_doc, tmp_path):
+    binary = tmp_path / "bad.txt"
+    binary.write_bytes(b"\xff\xfe\xfa not utf-8")
+
+    with pytest.raises(ValueError):
+        rag.index_document(str(binary), tenant="a")
+    with pytest.raises(ValueError):
+        rag.index_document(write_doc("   "), tenant="a")
+    assert rag.add_document(str(binary), tenant="a").startswith("❌")
+    assert rag.get_shard("a") is None
+
+
+def test_shards_saved_before_source_keys_still_load(rag, write_doc):
+    rag.add_document(write_doc("apple banana"), tenant="a")
+    store_path = os.path.join(rag.shard_dir("a"), rag.STORE_FILE)
+    with open(store_path, "w", encoding="utf-8") as f:
+        json.dump({"0": "apple banana"}, f)
+    rag.shards.clear()
+
+    assert stored_documents(rag, "a") == {0: "apple banana"}
+    assert rag.get_shard("a")["sources"] == {}
+
+
+class CountingCrossEncoder:
+    # Scores passages containing "target" high and everything else low, counting pairs
+    def __init__(self, spread):
+        self.spread = spread
+        self.pairs = 0
+
+    def predict(self, pairs, batch_size=32):
+        self.pairs += len(pairs)
+        return [self.spread if "target" in passage else -self.spread for _, passage in pairs]
+
+
+def add_rerank_corpus(rag, write_doc):
+    for _ in range(3):
+        rag.add_document(write_doc("target apple banana"), tenant="a", persist=False)
+    for i in range(37):
+        rag.add_document(write_doc(f"zebra walrus {i}"), tenant="a", persist=False)
+
+
+def test_rerank_stops_once_top_k_clearly_leads(rag, write_doc, monkeypatch):
+    add_rerank_corpus(rag, write_doc)
+    scorer = CountingCrossEncoder(spread=10.0)
+    monkeypatch.setattr(rag, "reranker", scorer)
+
+    results = rag.search_documents("target apple banana", top_k=3, rerank=True, tenants=["a"])
+
+    assert sorted(r["doc_id"] for r in results) == [0, 1, 2]
+    assert scorer.pairs == rag.RERANK_BATCH_SIZE
+
+
+def test_rerank_goes_deeper_while_scores_are_close(rag, write_doc, monkeypatch):
+    add_rerank_corpus(rag, write_doc)
+    scorer = CountingCrossEncoder(spread=0.0)
+    monkeypatch.setattr(rag, "reranker", scorer)
+
+    results = rag.search_documents("target apple banana", top_k=3, rerank=True, tenants=["a"])
+
+    assert len(results) == 3
+    assert scorer.pairs == 40
@@ -0,0 +1,26 @@
+import os
+
+import pytest
+
+import tenants
+
+
+@pytest.mark.parametrize("tenant", ["default", "alice", "team-42", "a_b", "x" * 64])
+def test_valid_tenants(tenant):
+    assert tenants.validate_tenant(tenant) == tenant
+
+
+@pytest.mark.parametrize("tenant", ["", "../etc", "a/b", "a b", "a.b", "x" * 65, "alice\n", None, 7])
+def test_invalid_tenants(tenant):
+    with pytest.raises(ValueError):
+        tenants.validate_tenant(tenant)
+
+
+def test_uploads_dir_is_per_tenant(tmp_path, monkeypatch):
+    monkeypatch.setattr(tenants, "UPLOADS_DIR", str(tmp_path))
+
+    assert tenants.uploads_dir() == str(tmp_path)
+    assert tenants.uploads_dir("alice") == os.path.join(str(tmp_path), "alice")
+    assert tenants.uploads_dir("alice") != tenants.uploads_dir("bob")
+    with pytest.raises(ValueError):
+        tenants.uploads_dir("../bob")